@@ -1,43 +1,153 @@
-from enum import Enum
+from functools import partial
+import mmap
+import os
 import sys
 
-
-class _CommandType(Enum):
-    C_ARITHMETIC = 1
-    C_PUSH = "push"
-    C_POP = "pop"
-    C_LABEL = 4
-    C_GOTO = 5
-    C_IF = 6
-    C_FUNCTION = 7
-    C_RETURN = 8
-    C_CALL = 9
-
-    arithmetic_commands = ["add", "sub", "neg",
-                           "eq", "gt", "lt", "and", "or", "not"]
-
-    @staticmethod
-    def from_string(command: str):
-        if command in ["add", "sub", "neg", "eq", "gt", "lt", "and", "or", "not"]:
-            return _CommandType.C_ARITHMETIC
-        elif command == "push":
-            return _CommandType.C_PUSH
-        elif command == "pop":
-            return _CommandType.C_POP
-        elif command.startswith("("):
-            return _CommandType.C_LABEL
-        elif command == "goto":
-            return _CommandType.C_GOTO
-        # elif command == "if-goto":
-        #     return _CommandType.C_IF
-        elif command == "function":
-            return _CommandType.C_FUNCTION
-        elif command == "return":
-            return _CommandType.C_RETURN
-        elif command == "call":
-            return _CommandType.C_CALL
-        else:
-            raise ValueError(command)
+# command types as plain ints: the dispatch loop compares one per VM
+# instruction, and an int compare is a single opcode vs Enum's __eq__
+C_ARITHMETIC = 1
+C_PUSH = 2
+C_POP = 3
+C_LABEL = 4
+C_GOTO = 5
+C_IF = 6
+C_FUNCTION = 7
+C_RETURN = 8
+C_CALL = 9
+
+# one O(1) hash lookup per opcode instead of a chain of string compares
+_OPCODE_TYPE = {
+    "add": C_ARITHMETIC,
+    "sub": C_ARITHMETIC,
+    "neg": C_ARITHMETIC,
+    "eq": C_ARITHMETIC,
+    "gt": C_ARITHMETIC,
+    "lt": C_ARITHMETIC,
+    "and": C_ARITHMETIC,
+    "or": C_ARITHMETIC,
+    "not": C_ARITHMETIC,
+    "push": C_PUSH,
+    "pop": C_POP,
+    "goto": C_GOTO,
+    # "if-goto": C_IF,
+    "function": C_FUNCTION,
+    "return": C_RETURN,
+    "call": C_CALL,
+}
+
+_PUSH_POP = frozenset({C_PUSH, C_POP})
+
+_CMP_JMP = {"eq": "JEQ", "gt": "JGT", "lt": "JLT"}
+
+
+def _command_type_from_string(command: str):
+    command_type = _OPCODE_TYPE.get(command)
+    if command_type is not None:
+        return command_type
+    elif command.startswith("("):
+        return C_LABEL
+    else:
+        raise ValueError(command)
+
+# base address for each memory segment; index arrives as an int from the
+# Parser so the target address is one add away
+_SEG_BASE = {
+    "local": 1,
+    "argument": 2,
+    "this": 3,
+    "that": 4,
+    "temp": 5,
+    "static": 16,
+    "pointer": 3,
+}
+
+
+# pre-fused asm templates: one format + one append per VM instruction
+# instead of a line-by-line emission loop; the pushes bump SP first and then
+# write through A=M-1 so SP is addressed once instead of twice
+_TMPL_PUSH_CONST = """// push constant {i}
+@{i}
+D=A
+@SP
+M=M+1
+A=M-1
+M=D"""
+
+_TMPL_PUSH_SEG = """// push {seg} {i}
+@{addr}
+A=M
+D=M
+@SP
+M=M+1
+A=M-1
+M=D"""
+
+_TMPL_POP_SEG = """// pop {seg} {i}
+@SP
+AM=M-1
+D=M
+@{addr}
+M=D"""
+
+_TMPL_ADD = """// add
+@SP
+AM=M-1
+D=M
+A=A-1
+M=M+D"""
+
+_TMPL_SUB = """// sub
+@SP
+AM=M-1
+D=M
+A=A-1
+M=M-D"""
+
+_TMPL_NEG = """// neg
+@SP
+A=M-1
+M=-M"""
+
+_TMPL_AND = """// and
+@SP
+AM=M-1
+D=M
+A=A-1
+M=M&D"""
+
+_TMPL_OR = """// or
+@SP
+AM=M-1
+D=M
+A=A-1
+M=M|D"""
+
+_TMPL_NOT = """// not
+@SP
+A=M-1
+M=!M"""
+
+_TMPL_CMP = """// {cmd}
+@SP
+AM=M-1
+D=M
+@SP
+AM=M-1
+D=M-D
+@CMP_TRUE_{n}
+D;{jmp}
+@SP
+A=M
+M=0
+@CMP_END_{n}
+0;JMP
+(CMP_TRUE_{n})
+@SP
+A=M
+M=-1
+(CMP_END_{n})
+@SP
+M=M+1"""
 
 
 class VmTranslator:
@@ -45,23 +155,32 @@ class VmTranslator:
 
     def __init__(self, in_file, out_file="out.asm"):
         self.parser = Parser(in_file)
-        self.code_writer = CodeWriter(out_file)
+        self.code_writer = CodeWriter(
+            out_file, size_hint=len(self.parser._types))
 
     def translate(self):
-        while self.parser.has_more_lines():
-            self.parser.advance()
-            current_instruction = self.parser.command_type()
-            if current_instruction == _CommandType.C_ARITHMETIC:
-                self.code_writer.write_arithmetic(self.parser.arg1())
-            elif current_instruction in [_CommandType.C_PUSH, _CommandType.C_POP]:
-                self.code_writer.write_push_pop(
-                    current_instruction, self.parser.arg1(), self.parser.arg2())
+        parser = self.parser
+        # walk the pre-decoded arrays directly, with everything the hot loop
+        # touches bound to locals so each iteration skips the attribute loads
+        types = parser._types
+        arg1s = parser._arg1
+        arg2s = parser._arg2
+        write_arithmetic = self.code_writer.write_arithmetic
+        write_push_pop = self.code_writer.write_push_pop
+
+        for i in range(len(types)):
+            current_instruction = types[i]
+            if current_instruction == C_ARITHMETIC:
+                write_arithmetic(arg1s[i])
+            elif current_instruction in _PUSH_POP:
+                write_push_pop(current_instruction, arg1s[i], arg2s[i])
             else:
                 print("Not implemented yet")
 
-        # for vm_instruction in self.code_writer.assembly:
-        #     for asm_instruction in vm_instruction:
-        #         print(asm_instruction)
+        parser._i = len(types) - 1
+
+        # for asm_instruction in self.code_writer._out:
+        #     print(asm_instruction)
 
     def close(self):
         self.code_writer.close()
@@ -75,65 +194,73 @@ class Parser:
     """
 
     _vm_instructions: list[str]
-    _current_instruction_index: int
-    _current_parsed_instruction: dict
+    _types: list
+    _arg1: list[str]
+    _arg2: list
+    _i: int
 
     def __init__(self, in_file):
+        # scan the file through mmap as bytes, decoding only the lines that
+        # survive comment/blank stripping; mmap rejects zero-byte files, so
+        # an empty input just leaves the instruction arrays empty
         self._vm_instructions = []
-        self._current_instruction_index = 0
-
-        with open(in_file, 'r') as f:
-            raw_vm_instructions = f.read().splitlines()
+        with open(in_file, 'rb') as f:
+            if os.fstat(f.fileno()).st_size > 0:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    for raw in iter(mm.readline, b''):
+                        comment_start = raw.find(b'//')
+                        if comment_start >= 0:
+                            raw = raw[:comment_start]
+                        stripped = raw.strip()
+                        if stripped:
+                            self._vm_instructions.append(
+                                stripped.decode('ascii'))
+
+        # pre-decode every instruction once into parallel arrays so advance()
+        # is just an index bump and the accessors are O(1) list lookups
+        self._types = []
+        self._arg1 = []
+        self._arg2 = []
+        for instruction in self._vm_instructions:
+            split_instruction = instruction.split()
+            instruction_type = _command_type_from_string(split_instruction[0])
+
+            # intern the opcode/segment so downstream == against literals is
+            # an identity compare
+            if instruction_type == C_ARITHMETIC:
+                arg1 = sys.intern(split_instruction[0])
+                arg2 = None
+            else:
+                arg1 = sys.intern(split_instruction[1])
+                # arg2 is always an index, so convert it eagerly
+                arg2 = int(split_instruction[2])
 
-        # remove comments and empty lines
-        for line in raw_vm_instructions:
-            instruction = line.strip().split("//")[0]
-            if instruction != "":
-                self._vm_instructions.append(instruction)
+            self._types.append(instruction_type)
+            self._arg1.append(arg1)
+            self._arg2.append(arg2)
 
-        self._current_parsed_instruction = None
+        self._i = -1
 
     def _current_raw_instruction(self):
-        return self._vm_instructions[self._current_instruction_index - 1]
-
-    @staticmethod
-    def _parse_instruction(raw_instruction):
-        split_instruction = raw_instruction.split()
-        instruction_type = _CommandType.from_string(split_instruction[0])
-
-        if instruction_type == _CommandType.C_ARITHMETIC:
-            arg1 = split_instruction[0]
-            arg2 = None
-        else:
-            arg1 = split_instruction[1]
-            arg2 = split_instruction[2]
-
-        return {
-            'type': instruction_type,
-            'arg1': arg1,
-            'arg2': arg2
-        }
+        return self._vm_instructions[self._i]
 
     def has_more_lines(self):
-        return self._current_instruction_index < (len(self._vm_instructions))
+        return self._i + 1 < len(self._types)
 
     def advance(self):
         if not self.has_more_lines():
             raise ValueError("No more lines to advance to")
 
-        self._current_instruction_index += 1
-
-        self._current_parsed_instruction = self._parse_instruction(
-            self._current_raw_instruction())
+        self._i += 1
 
     def command_type(self):
-        return self._current_parsed_instruction['type']
+        return self._types[self._i]
 
     def arg1(self):
-        return self._current_parsed_instruction['arg1']
+        return self._arg1[self._i]
 
     def arg2(self):
-        return self._current_parsed_instruction['arg2']
+        return self._arg2[self._i]
 
 
 class CodeWriter:
@@ -147,216 +274,126 @@ class CodeWriter:
         'static': 16,
     }
 
-    # we could generate a in a symbol table to make more effective use of memory but this is fine for now
-    default_bases = {
-        'sp': 256,
-    }
+    _out: list
+    _cursor: int
 
-    assembly: list[list[str]]
-    _temp_vm_instruction: list[str]
-
-    def __init__(self, out_file):
-        self.assembly = [[
-            "// initialize register values",
-            "@256",
-            "D=A",
-            "@SP",
-            "M=D",
-        ]]
-        self._temp_vm_instruction = []
-        self._lt_counter = 0
+    def __init__(self, out_file, size_hint=0):
+        # preallocate one slot per expected asm block (header + one block per
+        # VM instruction + END trailer) so emission never grows the list
+        self._out = [None] * (size_hint + 2)
+        self._out[0] = "// initialize register values\n@256\nD=A\n@SP\nM=D"
+        self._cursor = 1
+        self._cmp_counter = 0
         self.out_file = out_file
+        self._closed = False
+
+        # programs push the same constants and hit the same segment slots
+        # over and over; format each operand's asm block once and reuse it
+        self._push_const_cache: dict = {}
+        self._push_seg_cache: dict = {}
+        self._pop_seg_cache: dict = {}
+
+        # jump table: one dict lookup + indirect call per arithmetic op
+        self._ARITH = {
+            "add": self._emit_add,
+            "sub": self._emit_sub,
+            "neg": self._emit_neg,
+            "eq": partial(self._emit_cmp, "eq"),
+            "gt": partial(self._emit_cmp, "gt"),
+            "lt": partial(self._emit_cmp, "lt"),
+            "and": self._emit_and,
+            "or": self._emit_or,
+            "not": self._emit_not,
+        }
 
     """new lambda helpers: a_to_d, sp_to_d, deref_to_d, d_to_sp, d_to_deref, inc_sp, dec_sp"""
 
-    def _pop_to_d(self):
-        """*a is x and d is y; MAKE SURE to write to M after"""
-        self._temp_vm_instruction.append("@SP")
-        self._temp_vm_instruction.append("AM=M-1")
-        self._temp_vm_instruction.append("D=M")
-
-    def _generate_comparison(self, comparison):
-        instruction = None
-        if comparison == "eq":
-            instruction = "JEQ"
-        elif comparison == "gt":
-            instruction = "JGT"
-        elif comparison == "lt":
-            instruction = "JLT"
+    def _emit(self, block):
+        # cursor write into the preallocated buffer; fall back to append if a
+        # caller outruns the size hint
+        if self._cursor < len(self._out):
+            self._out[self._cursor] = block
         else:
+            self._out.append(block)
+        self._cursor += 1
+
+    def _emit_add(self):
+        # pop y into D, point A at x, store x + y
+        self._emit(_TMPL_ADD)
+
+    def _emit_sub(self):
+        # pop y into D, point A at x, store x - y
+        self._emit(_TMPL_SUB)
+
+    def _emit_neg(self):
+        # might need to fix this for booleans, not ints
+        self._emit(_TMPL_NEG)
+
+    def _emit_and(self):
+        self._emit(_TMPL_AND)
+
+    def _emit_or(self):
+        self._emit(_TMPL_OR)
+
+    def _emit_not(self):
+        self._emit(_TMPL_NOT)
+
+    def _emit_cmp(self, comparison):
+        instruction = _CMP_JMP.get(comparison)
+        if instruction is None:
             raise ValueError(comparison)
 
-        # sp--; y into D
-        self._temp_vm_instruction.append("@SP")
-        self._temp_vm_instruction.append("AM=M-1")
-        # D = *sp
-        self._temp_vm_instruction.append("D=M")
-
-        # sp--; x - y into D
-        self._temp_vm_instruction.append("@SP")
-        self._temp_vm_instruction.append("AM=M-1")
-        # D = *sp - D
-        self._temp_vm_instruction.append("D=M-D")
-
-        # @LT_TRUE_#;
-        self._temp_vm_instruction.append(
-            "@LT_TRUE_{}".format(self._lt_counter))
-        # D; JLT
-        self._temp_vm_instruction.append("D;{}".format(instruction))
-
-        # set *sp to false
-        # @SP
-        self._temp_vm_instruction.append("@SP")
-        # A=M
-        self._temp_vm_instruction.append("A=M")
-        # M=0
-        self._temp_vm_instruction.append("M=0")
-        # @LT_END_#;
-        self._temp_vm_instruction.append(
-            "@LT_END_{}".format(self._lt_counter))
-        # 0; JMP
-        self._temp_vm_instruction.append("0;JMP")
-
-        # true
-        # (LT_TRUE_#)
-        self._temp_vm_instruction.append(
-            "(LT_TRUE_{})".format(self._lt_counter))
-        # @SP
-        self._temp_vm_instruction.append("@SP")
-        # A=M
-        self._temp_vm_instruction.append("A=M")
-        # M=true
-        self._temp_vm_instruction.append("M=-1")
-
-        # (LT_END_#)
-        self._temp_vm_instruction.append(
-            "(LT_END_{})".format(self._lt_counter))
-        # sp++
-        self._temp_vm_instruction.append("@SP")
-        self._temp_vm_instruction.append("M=M+1")
-
-        # increment lt counter
-        self._lt_counter += 1
+        n = self._cmp_counter
+        self._cmp_counter = n + 1
+        self._emit(_TMPL_CMP.format(cmd=comparison, n=n, jmp=instruction))
 
     def write_arithmetic(self, command: str):
-        self._temp_vm_instruction = []
-
-        if command == "add":
-            # decrement sp
-            # copy *sp to D
-            # decrement A
-            # store M = M + D
-            self._temp_vm_instruction.append("// add")
-            self._pop_to_d()
-            self._temp_vm_instruction.append("A=A-1")
-            self._temp_vm_instruction.append("M=M+D")
-        elif command == "sub":
-            # decrement sp
-            # copy *sp to D
-            # decrement A
-            # store M = M - D
-            self._temp_vm_instruction.append("// sub")
-            self._pop_to_d()
-            self._temp_vm_instruction.append("A=A-1")
-            self._temp_vm_instruction.append("M=M-D")
-        elif command == "neg":
-            self._temp_vm_instruction.append("// neg")
-            self._temp_vm_instruction.append(
-                "@SP")
-            self._temp_vm_instruction.append("A=M-1")
-            # might need to fix this for booleans, not ints
-            self._temp_vm_instruction.append("M=-M")
-        elif command in ["lt", "gt", "eq"]:
-            self._generate_comparison(command)
-        elif command in ["and", "or"]:
-            operator = "&" if command == "and" else "|"
-            self._temp_vm_instruction.append("// {}".format(command))
-            self._pop_to_d()
-            self._temp_vm_instruction.append("A=A-1")
-            self._temp_vm_instruction.append("M=M{}D".format(operator))
-        elif command == "not":
-            self._temp_vm_instruction.append("// not")
-            self._temp_vm_instruction.append("@SP")
-            self._temp_vm_instruction.append("A=M-1")
-            self._temp_vm_instruction.append("M=!M")
-        else:
+        handler = self._ARITH.get(command)
+        if handler is None:
             raise ValueError(command)
-
-        # cleanup
-        self.assembly.append(self._temp_vm_instruction)
-        self._temp_vm_instruction = []
+        handler()
 
     def write_push_pop(self, command, segment, index):
         """TODO have first if be push/pop not constant/pointer"""
 
-        comment = '// {} {} {}'
-        if command == _CommandType.C_POP:
-            comment = comment.format('pop', segment, index)
-        else:
-            comment = comment.format('push', segment, index)
-        self._temp_vm_instruction.append(comment)
-
-        # new lambda helpers: a_to_d, sp_to_d, deref_to_d, d_to_sp, d_to_deref, inc_sp, dec_sp
-
         if segment == 'constant':
-            if command == _CommandType.C_PUSH:
-                self._temp_vm_instruction.append("@{}".format(index))
-                self._temp_vm_instruction.append("D=A")
-                self._temp_vm_instruction.append(
-                    "@SP")
-                self._temp_vm_instruction.append("A=M")
-                self._temp_vm_instruction.append("M=D")
-
-                self._temp_vm_instruction.append(
-                    "@SP")
-                self._temp_vm_instruction.append("M=M+1")
+            if command == C_PUSH:
+                block = self._push_const_cache.get(index)
+                if block is None:
+                    block = _TMPL_PUSH_CONST.format(i=index)
+                    self._push_const_cache[index] = block
+                self._emit(block)
 
             # we never pop a var to a constant, so no else statement
 
         else:  # segment/index must be an address/pointer
-            if command == _CommandType.C_PUSH:  # push (to some variable )
-                self._temp_vm_instruction.append(
-                    "@{}".format(self.default_bases[segment] + index))
-                self._temp_vm_instruction.append("A=M")
-                self._temp_vm_instruction.append("D=M")
-                self._temp_vm_instruction.append(
-                    "@SP")
-                self._temp_vm_instruction.append("A=M")
-                self._temp_vm_instruction.append("M=D")
-
-                self._temp_vm_instruction.append(
-                    "@SP")
-                self._temp_vm_instruction.append("M=M+1")
-
+            if command == C_PUSH:  # push (to some variable )
+                cache = self._push_seg_cache
+                template = _TMPL_PUSH_SEG
             else:  # pop (to some variable)
-                self._temp_vm_instruction.append(
-                    "@SP")
-                self._temp_vm_instruction.append("M=M-1")
-
-                self._temp_vm_instruction.append(
-                    "@SP")
-                self._temp_vm_instruction.append("A=M")
-                self._temp_vm_instruction.append("D=M")
-                self._temp_vm_instruction.append(
-                    "@{}".format(self.default_bases[segment] + index))
-                self._temp_vm_instruction.append("M=D")
+                cache = self._pop_seg_cache
+                template = _TMPL_POP_SEG
 
-        self.assembly.append(self._temp_vm_instruction)
-        self._temp_vm_instruction = []
+            block = cache.get((segment, index))
+            if block is None:
+                block = template.format(
+                    seg=segment, i=index, addr=_SEG_BASE[segment] + index)
+                cache[(segment, index)] = block
+            self._emit(block)
 
     def close(self):
-        self.assembly.append(["(END)", "@END", "0;JMP"])
-        f = open(self.out_file, 'w')
-        for vm_instruction in self.assembly:
-            for asm_instruction in vm_instruction:
-                f.write(asm_instruction + "\n")
+        if self._closed:
+            return 0
+        self._closed = True
+
+        self._emit("(END)\n@END\n0;JMP")
+        # one large buffered write instead of a flush per line
+        f = open(self.out_file, 'w', buffering=1 << 20)
+        f.write("\n".join(self._out[:self._cursor]) + "\n")
         f.close()
 
         return 0
 
-    def __del__(self):
-        return self.close()
-
 
 if __name__ == '__main__':
     # vm = VmTranslator(sys.argv[1], sys.argv[2])